@@ -7,6 +7,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from rag_pipeline import RAGPipeline
+from vector_store import close_clients
 
 # Загрузка переменных окружения из .env файла
 # Ищем .env в корне проекта (на уровень выше)
@@ -123,43 +124,47 @@ def main():
         print(f"❌ Ошибка инициализации: {e}")
         sys.exit(1)
     
-    # Основной цикл взаимодействия
-    while True:
-        try:
-            # Получение запроса от пользователя
-            user_input = input("💭 Ваш вопрос: ").strip()
-            
-            # Обработка специальных команд
-            if user_input.lower() in ['exit', 'quit', 'q']:
-                print("\n👋 До свидания!")
+    # Основной цикл взаимодействия (соединения закрываются явно при выходе)
+    try:
+        while True:
+            try:
+                # Получение запроса от пользователя
+                user_input = input("💭 Ваш вопрос: ").strip()
+                
+                # Обработка специальных команд
+                if user_input.lower() in ['exit', 'quit', 'q']:
+                    print("\n👋 До свидания!")
+                    break
+                
+                if user_input.lower() == 'stats':
+                    print_stats(pipeline)
+                    continue
+                
+                if user_input.lower() == 'clear':
+                    confirm = input("⚠️  Вы уверены, что хотите очистить кеш? (yes/no): ")
+                    if confirm.lower() in ['yes', 'y', 'да']:
+                        pipeline.cache.clear()
+                        print("✅ Кеш очищен")
+                    continue
+                
+                if not user_input:
+                    print("⚠️  Пожалуйста, введите вопрос\n")
+                    continue
+                
+                # Обработка запроса через RAG pipeline
+                result = pipeline.query(user_input)
+                
+                # Вывод результата
+                print_response(result)
+                
+            except KeyboardInterrupt:
+                print("\n\n👋 Прервано пользователем. До свидания!")
                 break
-            
-            if user_input.lower() == 'stats':
-                print_stats(pipeline)
-                continue
-            
-            if user_input.lower() == 'clear':
-                confirm = input("⚠️  Вы уверены, что хотите очистить кеш? (yes/no): ")
-                if confirm.lower() in ['yes', 'y', 'да']:
-                    pipeline.cache.clear()
-                    print("✅ Кеш очищен")
-                continue
-            
-            if not user_input:
-                print("⚠️  Пожалуйста, введите вопрос\n")
-                continue
-            
-            # Обработка запроса через RAG pipeline
-            result = pipeline.query(user_input)
-            
-            # Вывод результата
-            print_response(result)
-            
-        except KeyboardInterrupt:
-            print("\n\n👋 Прервано пользователем. До свидания!")
-            break
-        except Exception as e:
-            print(f"\n❌ Ошибка: {e}\n")
+            except Exception as e:
+                print(f"\n❌ Ошибка: {e}\n")
+    finally:
+        pipeline.close()
+        close_clients()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,18 @@
 """
 Модуль кеширования для RAG ассистента.
-Использует SQLite для хранения пар вопрос-ответ с временными метками.
+Использует SQLite для хранения пар вопрос-ответ с временными метками
+и для хранения вычисленных embeddings.
 """
 
 import sqlite3
 import hashlib
 import json
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import os
 
+import numpy as np
+
 
 class RAGCache:
     """Кеш для хранения результатов RAG запросов."""
@@ -151,6 +154,106 @@ class RAGCache:
         }
 
 
+class EmbeddingCache:
+    """Кеш embeddings с адресацией по хешу содержимого текста."""
+    
+    def __init__(self, db_path: str, model: str):
+        """
+        Инициализация кеша embeddings.
+        
+        Args:
+            db_path: путь к файлу базы данных SQLite
+            model: модель embeddings (входит в ключ, чтобы не смешивать векторы разных моделей)
+        """
+        self.db_path = db_path
+        self.model = model
+        self._init_db()
+    
+    def _init_db(self):
+        """Создание таблицы embeddings, если она не существует."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL
+            )
+        """)
+        
+        conn.commit()
+        conn.close()
+    
+    def _get_text_hash(self, text: str) -> str:
+        """
+        Вычисление ключа кеша для текста.
+        
+        Args:
+            text: текст
+            
+        Returns:
+            BLAKE2b хеш модели и текста
+        """
+        return hashlib.blake2b(f"{self.model}\n{text}".encode(), digest_size=16).hexdigest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Получение embeddings для списка текстов.
+        
+        Args:
+            texts: тексты
+            
+        Returns:
+            float32 векторы в порядке входных текстов, None для промахов
+        """
+        hashes = [self._get_text_hash(text) for text in texts]
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        found = {}
+        unique_hashes = list(set(hashes))
+        # Ограничение SQLite на число параметров в запросе
+        for i in range(0, len(unique_hashes), 500):
+            part = unique_hashes[i:i + 500]
+            cursor.execute(
+                f"SELECT text_hash, embedding FROM embeddings WHERE text_hash IN ({','.join('?' * len(part))})",
+                part
+            )
+            found.update(cursor.fetchall())
+        
+        conn.close()
+        
+        return [
+            np.frombuffer(found[h], dtype=np.float32) if h in found else None
+            for h in hashes
+        ]
+    
+    def set_many(self, texts: List[str], embeddings: np.ndarray):
+        """
+        Сохранение embeddings в кеш.
+        
+        Args:
+            texts: тексты
+            embeddings: соответствующие им векторы (float32 массив или список векторов)
+        """
+        rows = [
+            (self._get_text_hash(text), np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+            INSERT OR REPLACE INTO embeddings (text_hash, embedding)
+            VALUES (?, ?)
+        """, rows)
+        
+        conn.commit()
+        conn.close()
+
+
 if __name__ == "__main__":
     # Тестирование кеша
     cache = RAGCache("test_cache.db")
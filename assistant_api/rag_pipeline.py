@@ -7,7 +7,7 @@ from typing import Dict, Any, List
 import os
 from openai import OpenAI
 
-from vector_store import VectorStore
+from vector_store import VectorStore, close_clients
 from cache import RAGCache
 
 
@@ -40,8 +40,7 @@ class RAGPipeline:
         self.vector_store = VectorStore(collection_name=collection_name)
         
         # Загрузка документов, если коллекция пустая
-        collection_info = self.vector_store.client.get_collection(collection_name)
-        if collection_info.points_count == 0:
+        if self.vector_store.get_points_count() == 0:
             print(f"Загрузка документов из {data_file}...")
             self.vector_store.load_documents(data_file)
         
@@ -64,10 +63,6 @@ class RAGPipeline:
             # RAGCache не имеет метода close, но это не критично
             pass
     
-    def __del__(self):
-        """Автоматическое закрытие при удалении объекта."""
-        self.close()
-    
     def _create_prompt(self, query: str, context_docs: List[Dict[str, Any]]) -> str:
         """
         Создание промпта для LLM с контекстом.
@@ -244,6 +239,7 @@ if __name__ == "__main__":
             print(f"Кеш: {stats['cache']}")
             print(f"Режим: {stats['mode']}")
         
+        close_clients()
         print("✓ RAG Pipeline корректно закрыт")
         
     except Exception as e:
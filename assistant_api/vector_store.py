@@ -4,13 +4,29 @@
 """
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from typing import List, Dict, Any
+from qdrant_client.models import (
+    Distance, VectorParams, OptimizersConfigDiff, HnswConfigDiff, SearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, QuantizationSearchParams,
+    QueryRequest, CollectionStatus, PayloadSchemaType, Filter
+)
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import functools
+import hashlib
 import os
-from openai import OpenAI
+import random
+import re
+import threading
+import time
+import numpy as np
+import tiktoken
+from openai import OpenAI, RateLimitError
 from dotenv import load_dotenv
 from pathlib import Path
-import uuid
+
+from cache import EmbeddingCache
 
 
 env_path = Path(__file__).parent.parent / '.env'
@@ -21,31 +37,142 @@ else:
     load_dotenv()
 
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Размер блока потокового чтения файла с документами (в символах)
+READ_BLOCK_SIZE = 1 << 20
+
+# Размер чанка в токенах модели embeddings и перекрытие в предложениях
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_SENTENCES = 1
+
+# Разделитель предложений (с сохранением знаков препинания)
+_SENTENCE_SPLIT_RE = re.compile(r'([.!?]+\s+)')
+
+# Параметры батчинга запросов к OpenAI embeddings API
+EMBEDDING_BATCH_SIZE = 128
+EMBEDDING_BATCH_MAX_CHARS = 200_000
+EMBEDDING_MAX_WORKERS = 4
+EMBEDDING_MAX_RETRIES = 5
+
+# Параметры загрузки точек в Qdrant
+QDRANT_UPLOAD_BATCH_SIZE = 256
+QDRANT_UPLOAD_WINDOW_SIZE = 1024
+QDRANT_INDEXING_THRESHOLD = 20000
+
+# Ожидание построения индекса после загрузки (в секундах)
+INDEXING_POLL_INTERVAL = 0.5
+INDEXING_WAIT_TIMEOUT = 300
+
+# Во сколько раз больше кандидатов отбирается по int8 векторам перед rescoring
+QUANTIZATION_OVERSAMPLING = 2.0
+
+# Клиенты Qdrant, общие для всех VectorStore с одной директорией хранения.
+# Локальный Qdrant блокирует директорию, поэтому открывать её повторно
+# на каждый экземпляр нельзя (и дорого). Клиенты живут до close_clients()
+_CLIENT_CACHE: Dict[str, QdrantClient] = {}
+_CLIENT_LOCK = threading.Lock()
+
+
+def _get_qdrant_client(persist_directory: str) -> QdrantClient:
+    """
+    Получение общего Qdrant клиента для директории хранения.
+    
+    Args:
+        persist_directory: директория для хранения данных
+        
+    Returns:
+        клиент Qdrant (создаётся при первом обращении)
+    """
+    key = os.path.abspath(persist_directory)
+    with _CLIENT_LOCK:
+        client = _CLIENT_CACHE.get(key)
+        if client is None:
+            client = QdrantClient(path=persist_directory)
+            _CLIENT_CACHE[key] = client
+        return client
+
+
+def close_clients():
+    """
+    Закрытие всех общих Qdrant клиентов.
+    
+    Вызывается автоматически при завершении интерпретатора (atexit),
+    до того как клиенты будут закрыты из финализаторов во время teardown.
+    """
+    with _CLIENT_LOCK:
+        clients = list(_CLIENT_CACHE.values())
+        _CLIENT_CACHE.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_clients)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_openai_client() -> OpenAI:
+    """
+    Получение общего OpenAI клиента.
+    
+    Returns:
+        клиент OpenAI (создаётся при первом обращении)
+    """
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
 class VectorStore:
     """Векторное хранилище на основе Qdrant."""
     
-    def __init__(self, collection_name: str = "rag_collection", persist_directory: str = "./qdrant_db"):
+    def __init__(self,
+                 collection_name: str = "rag_collection",
+                 persist_directory: str = "./qdrant_db",
+                 expected_points: int = 0,
+                 hnsw_m: Optional[int] = None,
+                 hnsw_ef_construct: Optional[int] = None):
         """
         Инициализация векторного хранилища.
         
         Args:
             collection_name: имя коллекции в Qdrant
             persist_directory: директория для хранения данных
+            expected_points: ожидаемое число векторов, по нему подбираются параметры HNSW
+            hnsw_m: явное значение m для HNSW (переопределяет автоподбор)
+            hnsw_ef_construct: явное значение ef_construct для HNSW (переопределяет автоподбор)
         """
         self.collection_name = collection_name
         self.persist_directory = persist_directory
         
-        # Инициализация Qdrant клиента (локальный режим)
-        self.client = QdrantClient(path=persist_directory)
+        # Параметры HNSW индекса для новой коллекции
+        self.hnsw_params = self._hnsw_params_for_scale(expected_points)
+        if hnsw_m is not None:
+            self.hnsw_params["m"] = hnsw_m
+        if hnsw_ef_construct is not None:
+            self.hnsw_params["ef_construct"] = hnsw_ef_construct
         
-        # OpenAI клиент для создания embeddings
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Общий Qdrant клиент для директории (локальный режим)
+        self.client = _get_qdrant_client(persist_directory)
+        
+        # Общий OpenAI клиент для создания embeddings
+        self.openai_client = _get_openai_client()
+        
+        # Токенизатор модели embeddings для разбиения текста на чанки
+        self.encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
         
         # Размерность векторов для text-embedding-3-small
         self.vector_size = 1536
         
+        # Закешированное число точек в коллекции (None - нужно запросить у Qdrant)
+        self._points_count: Optional[int] = None
+        
         # Создание коллекции если не существует
         self._ensure_collection_exists()
+        
+        # Кеш embeddings рядом с данными Qdrant
+        self.embedding_cache = EmbeddingCache(
+            db_path=os.path.join(persist_directory, "embedding_cache.db"),
+            model=EMBEDDING_MODEL
+        )
     
     def __enter__(self):
         """Поддержка context manager."""
@@ -56,17 +183,17 @@ class VectorStore:
         self.close()
     
     def close(self):
-        """Закрытие соединения с Qdrant."""
+        """
+        Освобождение Qdrant клиента экземпляром.
+        
+        Клиент общий для всех экземпляров с той же директорией хранения,
+        поэтому здесь он не закрывается: другие экземпляры могут продолжать
+        его использовать. Сами соединения закрывает close_clients(),
+        который автоматически вызывается при завершении интерпретатора.
+        """
         if hasattr(self, 'client') and self.client:
-            try:
-                self.client.close()
-                print("✓ Соединение с Qdrant закрыто")
-            except Exception as e:
-                print(f"⚠️ Ошибка при закрытии Qdrant: {e}")
-    
-    def __del__(self):
-        """Автоматическое закрытие при удалении объекта."""
-        self.close()
+            self.client = None
+            print("✓ Клиент Qdrant освобождён")
     
     def _ensure_collection_exists(self):
         """Создание коллекции если она не существует."""
@@ -78,170 +205,272 @@ class VectorStore:
             if self.collection_name in collection_names:
                 # Получаем информацию о коллекции
                 collection_info = self.client.get_collection(self.collection_name)
+                self._points_count = collection_info.points_count
                 print(f"Коллекция '{self.collection_name}' загружена. Документов: {collection_info.points_count}")
             else:
                 # Создаем новую коллекцию
                 self.client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE)
+                    vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+                    hnsw_config=HnswConfigDiff(**self.hnsw_params),
+                    # int8 квантизация: в 4 раза меньше памяти и быстрее расчёт расстояний
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True)
+                    )
                 )
-                print(f"Создана новая коллекция '{self.collection_name}'")
+                # Индекс по chunk_id для быстрых фильтрованных запросов
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name="chunk_id",
+                    field_schema=PayloadSchemaType.INTEGER
+                )
+                self._points_count = 0
+                print(f"Создана новая коллекция '{self.collection_name}' (HNSW: {self.hnsw_params})")
         except Exception as e:
             print(f"Ошибка при работе с коллекцией: {e}")
             raise
     
-    def _chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
+    @staticmethod
+    def _hnsw_params_for_scale(n: int) -> Dict[str, int]:
         """
-        Умное разбиение текста на чанки с учётом семантики.
+        Подбор параметров HNSW по ожидаемому числу векторов.
         
-        Стратегия:
-        1. Приоритет абзацам (разделение по \n\n)
-        2. Разбиение длинных абзацев по предложениям
-        3. Сохранение контекста через overlap
-        4. Учёт минимального и максимального размера чанка
+        Для небольших коллекций используются значения не ниже стандартных
+        для Qdrant, с ростом коллекции m и ef_construct увеличиваются для
+        сохранения recall.
+        
+        Args:
+            n: ожидаемое число векторов
+            
+        Returns:
+            словарь с параметрами m и ef_construct
+        """
+        if n < 100_000:
+            return {"m": 16, "ef_construct": 128}
+        if n <= 1_000_000:
+            return {"m": 24, "ef_construct": 128}
+        return {"m": 32, "ef_construct": 200}
+    
+    def _chunk_text(self, text: str,
+                    chunk_tokens: int = CHUNK_TOKENS,
+                    overlap_sentences: int = CHUNK_OVERLAP_SENTENCES) -> List[str]:
+        """
+        Разбиение текста на чанки.
         
         Args:
             text: исходный текст
-            chunk_size: целевой размер чанка в символах
-            overlap: размер перекрытия между чанками
+            chunk_tokens: целевой размер чанка в токенах
+            overlap_sentences: число предложений перекрытия между чанками
             
         Returns:
             список чанков
         """
-        # Разделяем текст на абзацы
-        paragraphs = text.split('\n\n')
+        return list(self._chunk_paragraphs(text.split('\n\n'), chunk_tokens, overlap_sentences))
+    
+    def _chunk_paragraphs(self, paragraphs: Iterable[str],
+                          chunk_tokens: int = CHUNK_TOKENS,
+                          overlap_sentences: int = CHUNK_OVERLAP_SENTENCES) -> Iterator[str]:
+        """
+        Умное разбиение потока абзацев на чанки с учётом семантики.
         
-        chunks = []
-        current_chunk = ""
+        Стратегия:
+        1. Приоритет абзацам (разделение по \n\n)
+        2. Разбиение длинных абзацев по предложениям
+        3. Сохранение контекста через overlap из целых предложений
+        4. Размер чанка считается в токенах модели embeddings
+        
+        Args:
+            paragraphs: абзацы исходного текста
+            chunk_tokens: целевой размер чанка в токенах
+            overlap_sentences: число предложений перекрытия между чанками
+            
+        Yields:
+            чанки (слишком короткие отбрасываются)
+        """
+        # Пост-обработка: фильтруем слишком короткие чанки
+        for chunk in self._pack_paragraphs(paragraphs, chunk_tokens, overlap_sentences):
+            if len(chunk) >= 50:
+                yield chunk
+    
+    def _pack_paragraphs(self, paragraphs: Iterable[str], chunk_tokens: int, overlap_sentences: int) -> Iterator[str]:
+        """
+        Упаковка абзацев в чанки заданного размера в токенах.
+        
+        Args:
+            paragraphs: абзацы исходного текста
+            chunk_tokens: целевой размер чанка в токенах
+            overlap_sentences: число предложений перекрытия между чанками
+            
+        Yields:
+            чанки
+        """
+        # Части текущего чанка собираются в список и склеиваются один раз
+        # при закрытии чанка, чтобы не копировать строку на каждом шаге
+        current_parts = []
+        current_tokens = 0
         
         for paragraph in paragraphs:
             paragraph = paragraph.strip()
             if not paragraph:
                 continue
             
+            paragraph_tokens = self._count_tokens(paragraph)
+            
             # Если абзац помещается в текущий чанк
-            if len(current_chunk) + len(paragraph) + 2 <= chunk_size:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
-                else:
-                    current_chunk = paragraph
-            
-            # Если текущий чанк не пустой и добавление абзаца превысит размер
-            elif current_chunk:
-                chunks.append(current_chunk)
-                # Добавляем overlap из конца предыдущего чанка
-                overlap_text = self._get_overlap_text(current_chunk, overlap)
-                current_chunk = overlap_text + "\n\n" + paragraph if overlap_text else paragraph
+            if current_tokens + paragraph_tokens <= chunk_tokens:
+                current_parts.append(paragraph)
+                current_tokens += paragraph_tokens
+                continue
+            
+            # Закрываем текущий чанк, его последние предложения переходят в overlap
+            overlap_text = ""
+            if current_parts:
+                current_chunk = "\n\n".join(current_parts)
+                yield current_chunk
+                overlap_text = self._get_overlap_text(current_chunk, overlap_sentences)
             
             # Если абзац слишком большой, разбиваем его на предложения
+            if paragraph_tokens > chunk_tokens:
+                sentence_chunks = self._split_long_paragraph(paragraph, chunk_tokens, overlap_sentences)
+                
+                # Добавляем все чанки кроме последнего
+                yield from sentence_chunks[:-1]
+                current_parts = [sentence_chunks[-1]]
+                current_tokens = self._count_tokens(sentence_chunks[-1])
+            elif overlap_text:
+                current_parts = [overlap_text, paragraph]
+                current_tokens = self._count_tokens(overlap_text) + paragraph_tokens
             else:
-                if len(paragraph) > chunk_size:
-                    # Разбиваем длинный абзац на предложения
-                    sentence_chunks = self._split_long_paragraph(paragraph, chunk_size, overlap)
-                    
-                    # Добавляем все чанки кроме последнего
-                    if sentence_chunks:
-                        chunks.extend(sentence_chunks[:-1])
-                        current_chunk = sentence_chunks[-1]
-                else:
-                    current_chunk = paragraph
+                current_parts = [paragraph]
+                current_tokens = paragraph_tokens
         
         # Добавляем последний чанк
-        if current_chunk:
-            chunks.append(current_chunk)
+        if current_parts:
+            yield "\n\n".join(current_parts)
+    
+    def _count_tokens(self, text: str) -> int:
+        """
+        Подсчёт числа токенов текста для модели embeddings.
         
-        # Пост-обработка: фильтруем слишком короткие чанки
-        chunks = [chunk for chunk in chunks if len(chunk) >= 50]
+        Args:
+            text: текст
+            
+        Returns:
+            число токенов
+        """
+        return len(self.encoding.encode(text))
+    
+    def _split_sentences(self, text: str) -> List[str]:
+        """
+        Разбиение текста на предложения с сохранением знаков препинания.
         
-        return chunks
+        Args:
+            text: текст для разбиения
+            
+        Returns:
+            список непустых предложений
+        """
+        parts = _SENTENCE_SPLIT_RE.split(text)
+        
+        # Собираем предложения обратно с их разделителями
+        sentences = [parts[i] + parts[i + 1] for i in range(0, len(parts) - 1, 2)]
+        
+        # Если осталось что-то в конце без разделителя
+        if len(parts) % 2 == 1:
+            sentences.append(parts[-1])
+        
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
     
-    def _get_overlap_text(self, text: str, overlap_size: int) -> str:
+    def _split_by_tokens(self, text: str, chunk_tokens: int) -> List[str]:
         """
-        Получение текста для overlap из конца предыдущего чанка.
-        Пытается взять целые предложения.
+        Жёсткое разбиение текста на куски не длиннее chunk_tokens токенов.
         
         Args:
-            text: текст для извлечения overlap
-            overlap_size: желаемый размер overlap
+            text: текст для разбиения
+            chunk_tokens: максимальный размер куска в токенах
             
         Returns:
-            текст overlap
+            список кусков (сам текст, если он помещается целиком)
         """
-        if len(text) <= overlap_size:
-            return text
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= chunk_tokens:
+            return [text]
         
-        # Берём последние overlap_size символов
-        overlap_candidate = text[-overlap_size:]
+        # Режем по смещениям символов, чтобы не разрывать многобайтовые символы
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        bounds = [offsets[i] for i in range(0, len(tokens), chunk_tokens)] + [len(text)]
         
-        # Ищем начало предложения в overlap
-        sentence_starts = ['. ', '! ', '? ', '\n']
-        best_start = 0
+        pieces = [text[start:end].strip() for start, end in zip(bounds, bounds[1:])]
+        return [piece for piece in pieces if piece]
+    
+    def _get_overlap_text(self, text: str, overlap_sentences: int) -> str:
+        """
+        Получение текста для overlap из конца предыдущего чанка.
+        Берёт последние целые предложения.
         
-        for delimiter in sentence_starts:
-            pos = overlap_candidate.find(delimiter)
-            if pos != -1 and pos > best_start:
-                best_start = pos + len(delimiter)
+        Args:
+            text: текст для извлечения overlap
+            overlap_sentences: число предложений в overlap
+            
+        Returns:
+            текст overlap (пустой, если чанк целиком ушёл бы в overlap)
+        """
+        if overlap_sentences <= 0:
+            return ""
         
-        if best_start > 0:
-            return overlap_candidate[best_start:].strip()
+        sentences = self._split_sentences(text)
+        if len(sentences) <= overlap_sentences:
+            return ""
         
-        return overlap_candidate.strip()
+        return " ".join(sentences[-overlap_sentences:])
     
-    def _split_long_paragraph(self, paragraph: str, chunk_size: int, overlap: int) -> List[str]:
+    def _split_long_paragraph(self, paragraph: str, chunk_tokens: int, overlap_sentences: int) -> List[str]:
         """
         Разбиение длинного абзаца на чанки по предложениям.
         
         Args:
             paragraph: абзац для разбиения
-            chunk_size: целевой размер чанка
-            overlap: размер перекрытия
+            chunk_tokens: целевой размер чанка в токенах
+            overlap_sentences: число предложений перекрытия
             
         Returns:
             список чанков
         """
-        # Разделяем на предложения
-        import re
-        sentences = re.split(r'([.!?]+\s+)', paragraph)
-        
-        # Собираем предложения обратно с их разделителями
-        full_sentences = []
-        for i in range(0, len(sentences) - 1, 2):
-            if i + 1 < len(sentences):
-                full_sentences.append(sentences[i] + sentences[i + 1])
-            else:
-                full_sentences.append(sentences[i])
-        
-        # Если осталось что-то в конце без разделителя
-        if len(sentences) % 2 == 1:
-            full_sentences.append(sentences[-1])
-        
         chunks = []
-        current_chunk = ""
+        current_sentences = []
+        current_tokens = 0
+        
+        # Предложения длиннее chunk_tokens (таблицы, списки, код без знаков
+        # препинания) режутся по токенам, чтобы не превысить лимит модели
+        sentences = (
+            piece
+            for sentence in self._split_sentences(paragraph)
+            for piece in self._split_by_tokens(sentence, chunk_tokens)
+        )
         
-        for sentence in full_sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
+        for sentence in sentences:
+            sentence_tokens = self._count_tokens(sentence)
             
             # Если предложение помещается в текущий чанк
-            if len(current_chunk) + len(sentence) + 1 <= chunk_size:
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
+            if not current_sentences or current_tokens + sentence_tokens <= chunk_tokens:
+                current_sentences.append(sentence)
+                current_tokens += sentence_tokens
+                continue
+            
+            # Сохраняем текущий чанк, последние предложения переходят в overlap
+            chunks.append(" ".join(current_sentences))
+            if 0 < overlap_sentences < len(current_sentences):
+                current_sentences = current_sentences[-overlap_sentences:]
+                current_tokens = sum(self._count_tokens(s) for s in current_sentences)
             else:
-                # Сохраняем текущий чанк
-                if current_chunk:
-                    chunks.append(current_chunk)
-                    # Добавляем overlap
-                    overlap_text = self._get_overlap_text(current_chunk, overlap)
-                    current_chunk = overlap_text + " " + sentence if overlap_text else sentence
-                else:
-                    # Если одно предложение больше chunk_size, всё равно добавляем его
-                    current_chunk = sentence
-        
-        if current_chunk:
-            chunks.append(current_chunk)
+                current_sentences = []
+                current_tokens = 0
+            
+            current_sentences.append(sentence)
+            current_tokens += sentence_tokens
+        
+        if current_sentences:
+            chunks.append(" ".join(current_sentences))
         
         return chunks
     
@@ -249,6 +478,10 @@ class VectorStore:
         """
         Загрузка документов из файла в векторное хранилище.
         
+        Файл читается потоково: чтение, разбиение на чанки, создание
+        embeddings и загрузка в Qdrant идут конвейером, не требуя держать
+        весь корпус в памяти.
+        
         Args:
             file_path: путь к файлу с документами
         """
@@ -256,47 +489,216 @@ class VectorStore:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Файл {file_path} не найден")
         
-        # Чтение файла
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        
-        # Разбиение на чанки
-        chunks = self._chunk_text(text)
-        print(f"Текст разбит на {len(chunks)} чанков")
-        
         # Проверка, не загружены ли уже документы
-        collection_info = self.client.get_collection(self.collection_name)
-        if collection_info.points_count > 0:
+        if self.get_points_count() > 0:
             print("Документы уже загружены в коллекцию")
             return
         
-        # Создание embeddings и добавление в Qdrant
-        points = []
+        # На время массовой загрузки отключаем построение HNSW индекса,
+        # чтобы граф строился один раз в конце, а не после каждого батча
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            optimizer_config=OptimizersConfigDiff(indexing_threshold=0)
+        )
+        try:
+            try:
+                self._upload_windows(self._iter_upload_windows(self._iter_chunks(file_path)))
+            finally:
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    optimizer_config=OptimizersConfigDiff(indexing_threshold=QDRANT_INDEXING_THRESHOLD)
+                )
+            
+            # Все точки применены, дожидаемся построения индекса
+            self._wait_for_indexing()
+        finally:
+            # Число точек изменилось, при следующем обращении запросим заново
+            self._points_count = None
+        
+        print(f"Документы загружены в коллекцию '{self.collection_name}'")
+    
+    def _upload_windows(self, windows: Iterator[Tuple[List[int], np.ndarray, List[Dict[str, Any]]]]):
+        """
+        Загрузка окон точек в Qdrant.
+        
+        Окна отправляются без ожидания применения (wait=False), кроме
+        последнего: Qdrant применяет обновления по порядку, поэтому после
+        подтверждения последнего окна применены и все предыдущие.
         
-        for i, chunk in enumerate(chunks):
-            # Создание embedding через OpenAI
-            embedding = self._create_embedding(chunk)
+        Загрузка идёт в одном процессе (parallel=1): пул потоков embeddings
+        уже совмещает сетевые запросы с загрузкой, а parallel > 1 поднимал бы
+        новый пул процессов на каждое окно.
+        
+        Args:
+            windows: поток окон (ID, векторы, payload)
+        """
+        window = next(windows, None)
+        
+        while window is not None:
+            # Заглядываем на окно вперёд, чтобы узнать, последнее ли текущее
+            next_window = next(windows, None)
+            ids, vectors, payloads = window
             
-            # Создание точки для Qdrant
-            point = PointStruct(
-                id=str(uuid.uuid4()),  # Уникальный ID
-                vector=embedding,
-                payload={"text": chunk, "chunk_id": i}
+            self.client.upload_collection(
+                collection_name=self.collection_name,
+                vectors=vectors,
+                payload=payloads,
+                ids=ids,
+                batch_size=QDRANT_UPLOAD_BATCH_SIZE,
+                parallel=1,
+                wait=next_window is None
             )
-            points.append(point)
+            window = next_window
+    
+    def _wait_for_indexing(self, timeout: float = INDEXING_WAIT_TIMEOUT):
+        """
+        Ожидание завершения оптимизации коллекции.
+        
+        Ждём, пока коллекция в статусе yellow (идёт оптимизация).
+        Статус grey означает, что оптимизации отложены и сами не начнутся,
+        поэтому ожидание прекращается. Статус red означает ошибку оптимизатора.
+        
+        Args:
+            timeout: максимальное время ожидания в секундах
             
-            if (i + 1) % 10 == 0:
-                print(f"Обработано {i + 1}/{len(chunks)} чанков")
+        Raises:
+            RuntimeError: если оптимизация коллекции завершилась ошибкой
+        """
+        deadline = time.monotonic() + timeout
         
-        # Добавление в Qdrant батчами
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
-        )
+        while True:
+            status = self.client.get_collection(self.collection_name).status
+            
+            if status == CollectionStatus.GREEN:
+                return
+            if status == CollectionStatus.RED:
+                raise RuntimeError(f"Ошибка оптимизации коллекции '{self.collection_name}'")
+            if status == CollectionStatus.GREY:
+                print(f"⚠️ Оптимизация коллекции '{self.collection_name}' отложена и будет выполнена при следующем обновлении")
+                return
+            
+            if time.monotonic() >= deadline:
+                print(f"⚠️ Индексация коллекции '{self.collection_name}' не завершилась за {timeout} с")
+                return
+            time.sleep(INDEXING_POLL_INTERVAL)
+    
+    def _iter_paragraphs(self, file_path: str) -> Iterator[str]:
+        """
+        Потоковое чтение файла по абзацам.
         
-        print(f"Загружено {len(chunks)} документов в коллекцию '{self.collection_name}'")
+        Файл читается блоками, неполный абзац в конце блока переносится
+        в начало следующего.
+        
+        Args:
+            file_path: путь к файлу
+            
+        Yields:
+            абзацы текста
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            residue = ""
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                
+                paragraphs = (residue + block).split('\n\n')
+                residue = paragraphs.pop()
+                yield from paragraphs
+            
+            if residue:
+                yield residue
+    
+    def _iter_chunks(self, file_path: str) -> Iterator[str]:
+        """
+        Потоковое разбиение файла на чанки.
+        
+        Args:
+            file_path: путь к файлу
+            
+        Yields:
+            чанки текста
+        """
+        return self._chunk_paragraphs(self._iter_paragraphs(file_path))
+    
+    def _iter_upload_windows(self, chunks: Iterable[str]) -> Iterator[Tuple[List[int], np.ndarray, List[Dict[str, Any]]]]:
+        """
+        Группировка потока чанков в окна для загрузки в Qdrant.
+        
+        Окно хранится как набор параллельных массивов: ID, векторы одним
+        float32 массивом (N, vector_size) и payload. Размер окна задаёт
+        QDRANT_UPLOAD_WINDOW_SIZE.
+        
+        Args:
+            chunks: поток чанков
+            
+        Yields:
+            тройки (ID, векторы, payload) в исходном порядке чанков
+        """
+        ids, vectors, payloads = [], [], []
+        chunk_id = 0
+        
+        for batch, embeddings in self._iter_embedded_batches(chunks):
+            for chunk in batch:
+                ids.append(self._point_id(chunk))
+                payloads.append({"text": chunk, "chunk_id": chunk_id, "token_count": self._count_tokens(chunk)})
+                chunk_id += 1
+            vectors.append(embeddings)
+            
+            print(f"Обработано {chunk_id} чанков")
+            
+            if len(ids) >= QDRANT_UPLOAD_WINDOW_SIZE:
+                yield ids, np.concatenate(vectors), payloads
+                ids, vectors, payloads = [], [], []
+        
+        if ids:
+            yield ids, np.concatenate(vectors), payloads
+    
+    def _iter_embedded_batches(self, chunks: Iterable[str]) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Параллельное создание embeddings для потока чанков.
+        
+        Батчи отправляются в пул потоков, при этом в полёте держится
+        не больше EMBEDDING_MAX_WORKERS батчей, чтобы не читать весь
+        корпус в память раньше, чем он будет обработан.
+        
+        Args:
+            chunks: поток чанков
+            
+        Yields:
+            пары (батч чанков, их векторы) в исходном порядке
+        """
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS) as executor:
+            for batch in self._iter_batches(chunks):
+                pending.append((batch, executor.submit(self._create_embeddings_batch, batch)))
+                
+                if len(pending) >= EMBEDDING_MAX_WORKERS:
+                    done_batch, future = pending.popleft()
+                    yield done_batch, future.result()
+            
+            while pending:
+                done_batch, future = pending.popleft()
+                yield done_batch, future.result()
+    
+    @staticmethod
+    def _point_id(chunk: str) -> int:
+        """
+        Детерминированный ID точки по содержимому чанка.
+        
+        Повторная загрузка того же текста перезаписывает точку,
+        а не создаёт дубликат.
+        
+        Args:
+            chunk: текст чанка
+            
+        Returns:
+            беззнаковый 64-битный ID
+        """
+        return int.from_bytes(hashlib.blake2b(chunk.encode(), digest_size=8).digest(), "big")
     
-    def _create_embedding(self, text: str) -> List[float]:
+    def _create_embedding(self, text: str) -> np.ndarray:
         """
         Создание векторного представления текста через OpenAI.
         
@@ -306,57 +708,217 @@ class VectorStore:
         Returns:
             вектор embeddings
         """
-        response = self.openai_client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
+        return self._create_embeddings_batch([text])[0]
+    
+    def _create_embeddings_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Создание векторных представлений для списка текстов.
+        
+        Векторы, уже сохранённые в кеше, берутся из него, в OpenAI
+        отправляются только промахи.
+        
+        Args:
+            texts: тексты для векторизации
+            
+        Returns:
+            float32 массив (len(texts), vector_size) в порядке входных текстов
+        """
+        embeddings = np.empty((len(texts), self.vector_size), dtype=np.float32)
+        missing = []
+        
+        for i, cached in enumerate(self.embedding_cache.get_many(texts)):
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = self._request_embeddings(missing_texts)
+            self.embedding_cache.set_many(missing_texts, new_embeddings)
+            embeddings[missing] = new_embeddings
+        
+        return embeddings
+    
+    def _request_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Запрос векторных представлений у OpenAI одним запросом.
+        
+        При превышении rate limit запрос повторяется с экспоненциальной
+        задержкой и случайным jitter.
+        
+        Args:
+            texts: тексты для векторизации
+            
+        Returns:
+            float32 массив (len(texts), vector_size) в порядке входных текстов
+        """
+        for attempt in range(EMBEDDING_MAX_RETRIES):
+            try:
+                response = self.openai_client.embeddings.create(
+                    input=texts,
+                    model=EMBEDDING_MODEL
+                )
+                break
+            except RateLimitError:
+                if attempt == EMBEDDING_MAX_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt + random.random())
+        # API возвращает элементы с индексами, сортируем на всякий случай
+        return np.asarray(
+            [d.embedding for d in sorted(response.data, key=lambda d: d.index)],
+            dtype=np.float32
         )
-        return response.data[0].embedding
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _iter_batches(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        """
+        Разбиение потока текстов на батчи для embeddings API.
+        
+        Батч ограничен как по количеству текстов, так и по суммарной длине,
+        чтобы не превышать лимиты OpenAI на размер одного запроса.
+        
+        Args:
+            texts: тексты для разбиения
+            
+        Yields:
+            батчи текстов
+        """
+        current_batch = []
+        current_chars = 0
+        
+        for text in texts:
+            if current_batch and (
+                len(current_batch) >= EMBEDDING_BATCH_SIZE
+                or current_chars + len(text) > EMBEDDING_BATCH_MAX_CHARS
+            ):
+                yield current_batch
+                current_batch = []
+                current_chars = 0
+            
+            current_batch.append(text)
+            current_chars += len(text)
+        
+        if current_batch:
+            yield current_batch
+    
+    def search(self, query: str, top_k: int = 3, ef_search: Optional[int] = None,
+               qdrant_filter: Optional[Filter] = None) -> List[Dict[str, Any]]:
         """
         Поиск релевантных документов по запросу.
         
         Args:
             query: текст запроса
             top_k: количество документов для возврата
+            ef_search: параметр hnsw_ef (по умолчанию max(top_k * 10, 64))
+            qdrant_filter: фильтр Qdrant по payload (например, по chunk_id)
             
         Returns:
             список документов с метаданными
         """
-        # Создание embedding для запроса
-        query_embedding = self._create_embedding(query)
+        return self.search_many([query], top_k=top_k, ef_search=ef_search, qdrant_filter=qdrant_filter)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 3,
+                    ef_search: Optional[int] = None,
+                    qdrant_filter: Optional[Filter] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Поиск релевантных документов сразу по нескольким запросам.
+        
+        Embeddings всех запросов создаются одним запросом к OpenAI,
+        поиск выполняется одним batch-запросом к Qdrant.
+        
+        ef_search задаёт размер списка кандидатов при обходе HNSW графа:
+        меньшие значения ускоряют поиск ценой recall, большие повышают
+        recall ценой латентности. Переиндексация при этом не нужна.
+        
+        Args:
+            queries: тексты запросов
+            top_k: количество документов для возврата на каждый запрос
+            ef_search: параметр hnsw_ef (по умолчанию max(top_k * 10, 64))
+            qdrant_filter: фильтр Qdrant по payload, общий для всех запросов
+            
+        Returns:
+            списки документов с метаданными в порядке запросов
+        """
+        if not queries:
+            return []
+        
+        if ef_search is None:
+            ef_search = max(top_k * 10, 64)
+        
+        # Кандидаты отбираются по квантизованным векторам и пересчитываются по FP32
+        search_params = SearchParams(
+            hnsw_ef=ef_search,
+            quantization=QuantizationSearchParams(
+                rescore=True,
+                oversampling=QUANTIZATION_OVERSAMPLING
+            )
+        )
+        
+        # Создание embeddings для всех запросов
+        query_embeddings = self._create_embeddings_batch(queries)
         
         # Поиск в Qdrant
-        search_results = self.client.query_points(
+        responses = self.client.query_batch_points(
             collection_name=self.collection_name,
-            query=query_embedding,
-            limit=top_k
-        ).points
+            requests=[
+                QueryRequest(
+                    query=embedding.tolist(),
+                    filter=qdrant_filter,
+                    limit=top_k,
+                    params=search_params,
+                    # Забираем только поля, нужные для ответа
+                    with_payload=["text", "chunk_id"]
+                )
+                for embedding in query_embeddings
+            ]
+        )
         
         # Форматирование результатов
-        documents = []
-        for result in search_results:
-            documents.append({
-                'id': result.id,
-                'text': result.payload['text'],
-                'score': result.score,  # В Qdrant это similarity score (выше = лучше)
-                'chunk_id': result.payload.get('chunk_id', 0)
-            })
+        results = []
+        for response in responses:
+            documents = []
+            for result in response.points:
+                documents.append({
+                    'id': result.id,
+                    'text': result.payload['text'],
+                    'score': result.score,  # В Qdrant это similarity score (выше = лучше)
+                    'chunk_id': result.payload['chunk_id']
+                })
+            results.append(documents)
+        
+        return results
+    
+    def get_points_count(self, force: bool = False) -> int:
+        """
+        Получение числа точек в коллекции.
         
-        return documents
+        Значение кешируется и сбрасывается после загрузки документов,
+        чтобы не обращаться к Qdrant на каждый вызов.
+        
+        Args:
+            force: запросить значение у Qdrant, игнорируя кеш
+            
+        Returns:
+            число точек в коллекции
+        """
+        if force or self._points_count is None:
+            self._points_count = self.client.get_collection(self.collection_name).points_count
+        return self._points_count
     
-    def get_collection_stats(self) -> Dict[str, Any]:
+    def get_collection_stats(self, force: bool = False) -> Dict[str, Any]:
         """
         Получение статистики коллекции.
         
+        Args:
+            force: запросить число точек у Qdrant, игнорируя кеш
+        
         Returns:
             словарь со статистикой
         """
         try:
-            collection_info = self.client.get_collection(self.collection_name)
             return {
                 'name': self.collection_name,
-                'count': collection_info.points_count,
+                'count': self.get_points_count(force=force),
                 'persist_directory': self.persist_directory,
                 'vector_size': self.vector_size
             }
@@ -394,5 +956,6 @@ if __name__ == "__main__":
         stats = vector_store.get_collection_stats()
         print(f"\nСтатистика: {stats}")
     
+    close_clients()
     print("✓ Клиент Qdrant корректно закрыт")
 